@@ -1,10 +1,17 @@
 import os
+import html
 import logging
 import asyncio
 import time
+import signal
+import hashlib
+import functools
+from collections import OrderedDict
 from io import BytesIO
 from telegram import Update
+from telegram.constants import ParseMode
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram.request import HTTPXRequest
 from huggingface_hub import InferenceClient
 
 # Configure logging
@@ -14,7 +21,106 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Maximum number of prompts whose Telegram file_id is kept for re-sending
+IMAGE_CACHE_SIZE = 1024
+
+# Maximum number of Hugging Face calls in flight at once
+HF_CONCURRENCY = 4
+
+# Seconds before a Hugging Face call (including model-loading retries) gives up
+HF_TIMEOUT = 120
+
+# Seconds a model may run before the next fallback model is also queried
+FALLBACK_DELAY = 20
+
+# Model requested once at startup so it is loaded before the first user
+WARMUP_MODEL = "black-forest-labs/FLUX.1-dev"
+
+# Static reply texts, built once at import time
+WELCOME_GROUP = (
+    "🎨 <b>AI Image Generator Bot - Group Mode</b>\n\n"
+    "Use <code>/medusaXD &lt;description&gt;</code> to generate images in groups!\n\n"
+    "<b>Examples:</b>\n"
+    "• <code>/medusaXD Astronaut riding a horse</code>\n"
+    "• <code>/medusaXD Beautiful sunset over mountains</code>\n"
+    "• <code>/medusaXD Cute cat wearing sunglasses</code>\n\n"
+    "<b>Other Commands:</b>\n"
+    "• <code>/help</code> - Get detailed help\n"
+    "• <code>/status</code> - Check bot status\n\n"
+    "Ready to create amazing AI art! ✨"
+)
+
+WELCOME_PRIVATE = (
+    "🎨 <b>AI Image Generator Bot</b>\n\n"
+    "<b>Private Chat Mode:</b> Send me any text description and I'll generate an image!\n"
+    "<b>Group Mode:</b> Use <code>/medusaXD &lt;description&gt;</code> in groups!\n\n"
+    "<b>Examples:</b>\n"
+    "• <code>Astronaut riding a horse</code>\n"
+    "• <code>Beautiful sunset over mountains</code>\n"
+    "• <code>Cute cat wearing sunglasses</code>\n"
+    "• <code>Cyberpunk city at night</code>\n\n"
+    "<b>Commands:</b>\n"
+    "• <code>/start</code> - Show this welcome message\n"
+    "• <code>/help</code> - Get detailed help\n"
+    "• <code>/status</code> - Check bot status\n"
+    "• <code>/medusaXD &lt;prompt&gt;</code> - Generate image (groups)\n\n"
+    "Just type your description and wait for the magic! ✨"
+)
+
+HELP_GROUP = (
+    "🤖 <b>Group Mode - How to use:</b>\n\n"
+    "Use <code>/medusaXD &lt;description&gt;</code> to generate images!\n\n"
+    "<b>Example:</b>\n"
+    "<code>/medusaXD A majestic dragon flying over a castle</code>\n\n"
+    "<b>Tips for better results:</b>\n"
+    "• Be specific and descriptive\n"
+    "• Include style keywords (e.g., 'photorealistic', 'cartoon', 'oil painting')\n"
+    "• Mention colors, lighting, and mood\n"
+    "• Be patient - high-quality AI art takes time! 🎨\n\n"
+    "<b>Models:</b> FLUX.1-dev, Stable Diffusion XL, SD v1.5"
+)
+
+HELP_PRIVATE = (
+    "🤖 <b>How to use this bot:</b>\n\n"
+    "<b>Private Chat:</b> Send any text description\n"
+    "<b>Groups:</b> Use <code>/medusaXD &lt;description&gt;</code>\n\n"
+    "1. Send me a text description of what you want to see\n"
+    "2. Wait while I generate your image (10-30 seconds)\n"
+    "3. Receive your AI-generated image with generation time!\n\n"
+    "<b>Tips for better results:</b>\n"
+    "• Be specific and descriptive\n"
+    "• Include style keywords (e.g., 'photorealistic', 'cartoon', 'oil painting')\n"
+    "• Mention colors, lighting, and mood\n"
+    "• Be patient - high-quality AI art takes time! 🎨\n\n"
+    "<b>Models:</b> FLUX.1-dev, Stable Diffusion XL, SD v1.5\n"
+    "<b>Mode:</b> Background Worker (Polling)"
+)
+
+STATUS_TEMPLATE = (
+    "🟢 <b>Bot Status: Online</b>\n\n"
+    "• <b>Chat Type:</b> {chat_type}\n"
+    "• <b>Mode:</b> Background Worker (Polling)\n"
+    "• <b>Provider:</b> Hugging Face Inference API\n"
+    "• <b>Status:</b> Ready to generate images\n"
+    "• <b>Time Tracking:</b> Enabled ⏱️\n\n"
+    "• <b>Your ID:</b> <code>{user_id}</code>\n"
+    "• <b>Chat ID:</b> <code>{chat_id}</code>\n\n"
+    "<b>Usage:</b> {usage}"
+)
+
+def format_time(seconds):
+    """Format a duration for display in captions."""
+    if seconds < 1:
+        return f"{seconds:.2f}s"
+    else:
+        return f"{seconds:.1f}s"
+
 class ImageGeneratorBot:
+    __slots__ = (
+        'bot_token', 'hf_token', 'client', 'application',
+        '_image_cache', '_hf_sem', '_waiting', '_inflight', '_stop', '_warmup_task',
+    )
+
     def __init__(self):
         self.bot_token = os.environ.get("TELEGRAM_BOT_TOKEN")
         self.hf_token = os.environ.get("HF_TOKEN")
@@ -24,10 +130,41 @@ class ImageGeneratorBot:
         if not self.hf_token:
             raise ValueError("HF_TOKEN environment variable is not set!")
 
-        # Initialize Hugging Face client correctly
-        self.client = InferenceClient(token=self.hf_token)
-
-        self.application = Application.builder().token(self.bot_token).build()
+        # Sync client, called from worker threads. The AsyncInferenceClient in
+        # huggingface-hub 0.20.3 opens a new session per call and blocks the
+        # event loop with time.sleep() while a model is loading.
+        self.client = InferenceClient(token=self.hf_token, timeout=HF_TIMEOUT)
+
+        # LRU cache: prompt hash -> (Telegram file_id, model used)
+        self._image_cache = OrderedDict()
+
+        # Bound concurrent Hugging Face calls; extra calls wait in line
+        self._hf_sem = asyncio.Semaphore(HF_CONCURRENCY)
+
+        # slot_acquired futures of generations waiting for their first slot,
+        # in arrival order; used for the queue position shown to users
+        self._waiting = []
+
+        # In-flight generations keyed like the image cache, shared by duplicate
+        # prompts: cache key -> (inference task, future of the owner's file_id)
+        self._inflight = {}
+
+        # Set by SIGINT/SIGTERM to stop polling
+        self._stop = asyncio.Event()
+        self._warmup_task = None
+
+        # Handle updates concurrently and give outgoing requests their own
+        # HTTP/2 pool, separate from the long-polling getUpdates connection.
+        # An explicit HTTPXRequest defaults to a single connection, so keep the
+        # 256 connections the builder would otherwise configure
+        self.application = (
+            Application.builder()
+            .token(self.bot_token)
+            .request(HTTPXRequest(connection_pool_size=256, pool_timeout=30, http_version="2"))
+            .get_updates_request(HTTPXRequest(connection_pool_size=1))
+            .concurrent_updates(True)
+            .build()
+        )
         self._setup_handlers()
 
     def _setup_handlers(self):
@@ -49,102 +186,38 @@ class ImageGeneratorBot:
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Send welcome message when /start is issued."""
         chat_type = "group" if update.effective_chat.type in ['group', 'supergroup'] else "private"
+        welcome_message = WELCOME_GROUP if chat_type == "group" else WELCOME_PRIVATE
 
-        if chat_type == "group":
-            welcome_message = (
-                "🎨 **AI Image Generator Bot - Group Mode**\n\n"
-                "Use `/medusaXD <description>` to generate images in groups!\n\n"
-                "**Examples:**\n"
-                "• `/medusaXD Astronaut riding a horse`\n"
-                "• `/medusaXD Beautiful sunset over mountains`\n"
-                "• `/medusaXD Cute cat wearing sunglasses`\n\n"
-                "**Other Commands:**\n"
-                "• `/help` - Get detailed help\n"
-                "• `/status` - Check bot status\n\n"
-                "Ready to create amazing AI art! ✨"
-            )
-        else:
-            welcome_message = (
-                "🎨 **AI Image Generator Bot**\n\n"
-                "**Private Chat Mode:** Send me any text description and I'll generate an image!\n"
-                "**Group Mode:** Use `/medusaXD <description>` in groups!\n\n"
-                "**Examples:**\n"
-                "• `Astronaut riding a horse`\n"
-                "• `Beautiful sunset over mountains`\n"
-                "• `Cute cat wearing sunglasses`\n"
-                "• `Cyberpunk city at night`\n\n"
-                "**Commands:**\n"
-                "• `/start` - Show this welcome message\n"
-                "• `/help` - Get detailed help\n"
-                "• `/status` - Check bot status\n"
-                "• `/medusaXD <prompt>` - Generate image (groups)\n\n"
-                "Just type your description and wait for the magic! ✨"
-            )
-
-        await update.message.reply_text(welcome_message, parse_mode='Markdown')
-        logger.info(f"User {update.effective_user.id} started the bot in {chat_type}")
+        await update.message.reply_text(welcome_message, parse_mode=ParseMode.HTML)
+        logger.info("User %s started the bot in %s", update.effective_user.id, chat_type)
 
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Send help message when /help is issued."""
-        chat_type = "group" if update.effective_chat.type in ['group', 'supergroup'] else "private"
+        is_group = update.effective_chat.type in ['group', 'supergroup']
+        help_text = HELP_GROUP if is_group else HELP_PRIVATE
 
-        if chat_type == "group":
-            help_text = (
-                "🤖 **Group Mode - How to use:**\n\n"
-                "Use `/medusaXD <description>` to generate images!\n\n"
-                "**Example:**\n"
-                "`/medusaXD A majestic dragon flying over a castle`\n\n"
-                "**Tips for better results:**\n"
-                "• Be specific and descriptive\n"
-                "• Include style keywords (e.g., 'photorealistic', 'cartoon', 'oil painting')\n"
-                "• Mention colors, lighting, and mood\n"
-                "• Be patient - high-quality AI art takes time! 🎨\n\n"
-                "**Models:** FLUX.1-dev, Stable Diffusion XL, SD v1.5"
-            )
-        else:
-            help_text = (
-                "🤖 **How to use this bot:**\n\n"
-                "**Private Chat:** Send any text description\n"
-                "**Groups:** Use `/medusaXD <description>`\n\n"
-                "1. Send me a text description of what you want to see\n"
-                "2. Wait while I generate your image (10-30 seconds)\n"
-                "3. Receive your AI-generated image with generation time!\n\n"
-                "**Tips for better results:**\n"
-                "• Be specific and descriptive\n"
-                "• Include style keywords (e.g., 'photorealistic', 'cartoon', 'oil painting')\n"
-                "• Mention colors, lighting, and mood\n"
-                "• Be patient - high-quality AI art takes time! 🎨\n\n"
-                "**Models:** FLUX.1-dev, Stable Diffusion XL, SD v1.5\n"
-                "**Mode:** Background Worker (Polling)"
-            )
-
-        await update.message.reply_text(help_text, parse_mode='Markdown')
+        await update.message.reply_text(help_text, parse_mode=ParseMode.HTML)
 
     async def status(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Send bot status information."""
-        chat_type = "group" if update.effective_chat.type in ['group', 'supergroup'] else "private"
+        is_group = update.effective_chat.type in ['group', 'supergroup']
 
-        status_text = (
-            "🟢 **Bot Status: Online**\n\n"
-            f"• **Chat Type:** {chat_type.title()}\n"
-            "• **Mode:** Background Worker (Polling)\n"
-            "• **Provider:** Hugging Face Inference API\n"
-            "• **Status:** Ready to generate images\n"
-            "• **Time Tracking:** Enabled ⏱️\n\n"
-            f"• **Your ID:** `{update.effective_user.id}`\n"
-            f"• **Chat ID:** `{update.effective_chat.id}`\n\n"
-            f"**Usage:** {'Use /medusaXD <prompt>' if chat_type == 'group' else 'Send any text description'}"
+        status_text = STATUS_TEMPLATE.format(
+            chat_type="Group" if is_group else "Private",
+            user_id=update.effective_user.id,
+            chat_id=update.effective_chat.id,
+            usage="Use /medusaXD &lt;prompt&gt;" if is_group else "Send any text description",
         )
-        await update.message.reply_text(status_text, parse_mode='Markdown')
+        await update.message.reply_text(status_text, parse_mode=ParseMode.HTML)
 
     async def medusa_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle /medusaXD command for groups."""
         # Get the prompt from command arguments
         if not context.args:
             await update.message.reply_text(
-                "❗ **Usage:** `/medusaXD <description>`\n\n"
-                "**Example:** `/medusaXD Astronaut riding a horse`",
-                parse_mode='Markdown'
+                "❗ <b>Usage:</b> <code>/medusaXD &lt;description&gt;</code>\n\n"
+                "<b>Example:</b> <code>/medusaXD Astronaut riding a horse</code>",
+                parse_mode=ParseMode.HTML
             )
             return
 
@@ -169,99 +242,345 @@ class ImageGeneratorBot:
             await update.message.reply_text("Please keep your description under 500 characters!")
             return
 
-        logger.info(f"User {user_id} ({username}) requested image: {user_prompt}")
+        logger.info("User %s (%s) requested image: %s", user_id, username, user_prompt)
+
+        # Escape user-supplied text once for the HTML replies below
+        prompt_html = html.escape(user_prompt)
+        username_html = html.escape(username)
 
         # Record start time
         start_time = time.time()
 
-        # Send generating message
+        # Re-send a previously generated image straight from Telegram's servers
+        cache_key = self._cache_key(user_prompt)
+        cached = self._image_cache.get(cache_key)
+        if cached is not None:
+            file_id, used_model = cached
+            try:
+                await update.message.reply_photo(
+                    photo=file_id,
+                    caption=(
+                        f"🎨 <b>Generated Image</b> (cached)\n\n"
+                        f"<b>Prompt:</b> <code>{prompt_html}</code>\n"
+                        f"<b>Model:</b> <code>{used_model.split('/')[-1]}</code>\n"
+                        f"<b>Requested by:</b> @{username_html}"
+                    ),
+                    parse_mode=ParseMode.HTML
+                )
+            except Exception as e:
+                # Stale or invalid file_id: forget it and generate a fresh image
+                logger.warning("Cached image for user %s could not be sent: %s", user_id, e)
+                self._image_cache.pop(cache_key, None)
+            else:
+                self._image_cache.move_to_end(cache_key)
+                logger.info("Served cached image for user %s", user_id)
+                return
+
+        # Send generating message in the background while inference starts;
+        # it is only awaited once it needs to be edited or deleted
         command_text = f"/medusaXD {user_prompt}" if is_group else user_prompt
-        status_message = await update.message.reply_text(
-            "🎨 **Generating your image...**\n\n"
-            f"**Prompt:** `{user_prompt}`\n"
-            f"**Requested by:** @{username}\n"
-            "⏳ This may take 10-30 seconds...",
-            parse_mode='Markdown'
+        generating_text = (
+            "🎨 <b>Generating your image...</b>\n\n"
+            f"<b>Prompt:</b> <code>{prompt_html}</code>\n"
+            f"<b>Requested by:</b> @{username_html}\n"
+            "⏳ This may take 10-30 seconds..."
+        )
+        status_task = asyncio.create_task(
+            update.message.reply_text(generating_text, parse_mode=ParseMode.HTML)
         )
 
+        # The first caller for a prompt owns the generation and publishes the
+        # file_id of its upload; identical prompts arriving meanwhile join it
+        is_owner = False
+        file_id_future = None
+
         try:
             # Generate image using Hugging Face Inference API
-            logger.info(f"Starting image generation for user {user_id}")
-
-            # Try different models in order of preference
-            models_to_try = [
-                "black-forest-labs/FLUX.1-dev",
-                "stabilityai/stable-diffusion-xl-base-1.0", 
-                "runwayml/stable-diffusion-v1-5"
-            ]
+            logger.info("Starting image generation for user %s", user_id)
+
+            inflight = self._inflight.get(cache_key)
+            if inflight is None:
+                is_owner = True
+                loop = asyncio.get_running_loop()
+                # Resolved with whether the first call had to wait for a slot,
+                # and with the time the first Hugging Face slot is acquired
+                slot_queued = loop.create_future()
+                slot_acquired = loop.create_future()
+                infer_task = asyncio.create_task(
+                    self._do_infer(user_prompt, slot_queued, slot_acquired)
+                )
+                file_id_future = loop.create_future()
+                self._inflight[cache_key] = (infer_task, file_id_future)
+                file_id_future.add_done_callback(functools.partial(self._forget_inflight, cache_key))
+
+                # Let the generation reach the semaphore before deciding whether it
+                # is queued; updates from one getUpdates batch all start unlocked
+                await asyncio.wait({slot_queued, infer_task}, return_when=asyncio.FIRST_COMPLETED)
+                if slot_queued.done() and slot_queued.result() and not slot_acquired.done():
+                    self._waiting.append(slot_acquired)
+                    queue_position = len(self._waiting)
+                    try:
+                        status_message = await self._status_message(status_task)
+                        if status_message is not None:
+                            await self._edit_status(
+                                status_message,
+                                "⏳ <b>Waiting for a free slot...</b>\n\n"
+                                f"<b>Prompt:</b> <code>{prompt_html}</code>\n"
+                                f"<b>Requested by:</b> @{username_html}\n"
+                                f"<b>Position in queue:</b> #{queue_position}"
+                            )
+
+                        # Restore the generating message once a slot frees up
+                        await asyncio.wait({slot_acquired, infer_task}, return_when=asyncio.FIRST_COMPLETED)
+                        if status_message is not None and slot_acquired.done() and not infer_task.done():
+                            await self._edit_status(status_message, generating_text)
+                    finally:
+                        self._waiting.remove(slot_acquired)
+            else:
+                infer_task, file_id_future = inflight
+                logger.info("Joining in-flight generation for user %s", user_id)
+
+            # Shield the shared task so one cancelled caller doesn't cancel the others
+            used_model, image_data, generation_time = await asyncio.shield(infer_task)
+
+            photo = image_data
+            if not is_owner:
+                # Re-send the owner's upload by file_id; upload ourselves only if it failed
+                photo = await asyncio.shield(file_id_future) or image_data
 
-            image = None
-            used_model = None
-            generation_start = time.time()
-
-            for model in models_to_try:
-                try:
-                    logger.info(f"Trying model: {model}")
-                    image = self.client.text_to_image(user_prompt, model=model)
-                    used_model = model
-                    break
-                except Exception as model_error:
-                    logger.warning(f"Model {model} failed: {str(model_error)}")
-                    continue
-
-            if image is None:
-                raise Exception("All models failed to generate image")
-
-            generation_time = time.time() - generation_start
             total_time = time.time() - start_time
 
-            # Convert PIL image to bytes
-            img_buffer = BytesIO()
-            image.save(img_buffer, format='PNG', quality=95)
-            img_buffer.seek(0)
-
-            # Format time display
-            def format_time(seconds):
-                if seconds < 1:
-                    return f"{seconds:.2f}s"
-                else:
-                    return f"{seconds:.1f}s"
-
             # Send the image with time information
             caption = (
-                f"🎨 **Generated Image**\n\n"
-                f"**Prompt:** `{user_prompt}`\n"
-                f"**Model:** `{used_model.split('/')[-1]}`\n"
-                f"**Requested by:** @{username}\n"
-                f"⏱️ **Generation Time:** {format_time(generation_time)}\n"
-                f"🕐 **Total Time:** {format_time(total_time)}"
+                f"🎨 <b>Generated Image</b>\n\n"
+                f"<b>Prompt:</b> <code>{prompt_html}</code>\n"
+                f"<b>Model:</b> <code>{used_model.split('/')[-1]}</code>\n"
+                f"<b>Requested by:</b> @{username_html}\n"
+                f"⏱️ <b>Generation Time:</b> {format_time(generation_time)}\n"
+                f"🕐 <b>Total Time:</b> {format_time(total_time)}"
             )
 
-            await update.message.reply_photo(
-                photo=img_buffer,
+            sent_message = await update.message.reply_photo(
+                photo=photo,
                 caption=caption,
-                parse_mode='Markdown'
+                parse_mode=ParseMode.HTML
+            )
+            file_id = sent_message.photo[-1].file_id
+            self._store_cached(cache_key, file_id, used_model)
+            if is_owner:
+                file_id_future.set_result(file_id)
+
+            # Delete status message; the photo is already delivered, so a failure
+            # here must not be reported as a failed generation
+            status_message = await self._status_message(status_task)
+            if status_message is not None:
+                try:
+                    await status_message.delete()
+                except Exception as e:
+                    logger.warning("Could not delete status message for user %s: %s", user_id, e)
+            logger.info(
+                "Successfully generated image for user %s using %s in %.2fs",
+                user_id, used_model, generation_time
             )
-
-            # Delete status message
-            await status_message.delete()
-            logger.info(f"Successfully generated image for user {user_id} using {used_model} in {generation_time:.2f}s")
 
         except Exception as e:
             error_msg = str(e)
             error_time = time.time() - start_time
-            logger.error(f"Error generating image for user {user_id}: {error_msg}")
+            logger.error("Error generating image for user %s: %s", user_id, error_msg)
 
-            await status_message.edit_text(
-                f"❌ **Generation Failed**\n\n"
+            failure_text = (
+                f"❌ <b>Generation Failed</b>\n\n"
                 f"Sorry, I couldn't generate an image for that prompt.\n"
                 f"Please try again with a different description.\n\n"
-                f"**Prompt:** `{user_prompt}`\n"
-                f"**Requested by:** @{username}\n"
-                f"⏱️ **Time elapsed:** {error_time:.1f}s\n"
-                f"**Error:** `{error_msg[:100]}{'...' if len(error_msg) > 100 else ''}`",
-                parse_mode='Markdown'
+                f"<b>Prompt:</b> <code>{prompt_html}</code>\n"
+                f"<b>Requested by:</b> @{username_html}\n"
+                f"⏱️ <b>Time elapsed:</b> {error_time:.1f}s\n"
+                f"<b>Error:</b> <code>{html.escape(error_msg[:100])}{'...' if len(error_msg) > 100 else ''}</code>"
             )
+            status_message = await self._status_message(status_task)
+            if status_message is not None:
+                await status_message.edit_text(failure_text, parse_mode=ParseMode.HTML)
+            else:
+                await update.message.reply_text(failure_text, parse_mode=ParseMode.HTML)
+
+        finally:
+            # Release joiners even if the owner never sent its photo
+            if is_owner and not file_id_future.done():
+                file_id_future.set_result(None)
+
+    @staticmethod
+    async def _status_message(status_task: asyncio.Task):
+        """Return the sent status message, or None if sending it failed."""
+        try:
+            return await status_task
+        except Exception as e:
+            logger.warning("Could not send status message: %s", e)
+            return None
+
+    @staticmethod
+    async def _edit_status(status_message, text: str) -> None:
+        """Edit the status message; a failed edit must not abort the generation."""
+        try:
+            await status_message.edit_text(text, parse_mode=ParseMode.HTML)
+        except Exception as e:
+            logger.warning("Could not edit status message: %s", e)
+
+    @staticmethod
+    def _cache_key(prompt: str) -> str:
+        """Build the image cache key for a prompt."""
+        return hashlib.sha256(prompt.lower().strip().encode('utf-8')).hexdigest()
+
+    def _store_cached(self, cache_key: str, file_id: str, model: str) -> None:
+        """Remember a sent photo, evicting the least recently used entry."""
+        self._image_cache[cache_key] = (file_id, model)
+        self._image_cache.move_to_end(cache_key)
+        if len(self._image_cache) > IMAGE_CACHE_SIZE:
+            self._image_cache.popitem(last=False)
+
+    @staticmethod
+    def _encode_image(image) -> bytes:
+        """Encode a PIL image to JPEG bytes ready for upload."""
+        # JPEG keeps uploads small; Telegram recompresses photos to JPEG anyway
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', quality=90, optimize=True)
+        return buffer.getvalue()
+
+    def _forget_inflight(self, cache_key: str, file_id_future: asyncio.Future) -> None:
+        """Drop a finished generation from the in-flight map."""
+        entry = self._inflight.get(cache_key)
+        if entry is not None and entry[1] is file_id_future:
+            del self._inflight[cache_key]
+
+    async def _do_infer(self, prompt: str, slot_queued: asyncio.Future, slot_acquired: asyncio.Future):
+        """Generate an image for prompt, returning (model, JPEG bytes, generation time)."""
+        # Try different models in order of preference
+        models_to_try = [
+            "black-forest-labs/FLUX.1-dev",
+            "stabilityai/stable-diffusion-xl-base-1.0", 
+            "runwayml/stable-diffusion-v1-5"
+        ]
+
+        # Start models in order of preference. A fallback is only started once
+        # the running models have failed or the latest one has held its slot
+        # for FALLBACK_DELAY, so a warm FLUX answers on its own, a cold one
+        # doesn't block the reply, and queueing for a slot never counts as slow
+        loop = asyncio.get_running_loop()
+        tasks = []
+        try:
+            for model in models_to_try:
+                # Resolved with the time this model's call gets a Hugging Face slot
+                call_slot = loop.create_future()
+                call_slot.add_done_callback(functools.partial(self._first_slot, slot_acquired))
+                tasks.append(asyncio.create_task(
+                    self._generate_with_model(prompt, model, call_slot, slot_queued)
+                ))
+                result = await self._first_success(tasks, FALLBACK_DELAY, call_slot)
+                if result is not None:
+                    break
+            else:
+                result = await self._first_success(tasks, None)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if result is None:
+            raise Exception("All models failed to generate image")
+        used_model, image = result
+
+        # Generation time excludes waiting in the queue for a free slot
+        generation_time = time.time() - slot_acquired.result()
+
+        # Encode once for every caller sharing this generation, in a worker
+        # thread so the event loop keeps serving other chats
+        image_data = await asyncio.to_thread(self._encode_image, image)
+        return used_model, image_data, generation_time
+
+    @staticmethod
+    def _first_slot(slot_acquired: asyncio.Future, call_slot: asyncio.Future) -> None:
+        """Record the first slot acquisition of a generation."""
+        if not slot_acquired.done():
+            slot_acquired.set_result(call_slot.result())
+
+    @staticmethod
+    async def _first_success(tasks, timeout, started=None):
+        """Wait for a successful task, preferring earlier ones in the list.
+
+        The timeout only starts once ``started`` resolves with the time the
+        latest task's call got its slot. Returns the result, or None if all
+        tasks failed or the timeout expired.
+        """
+        deadline = None
+        while True:
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    return task.result()
+
+            pending = [task for task in tasks if not task.done()]
+            if not pending:
+                return None
+
+            if timeout is not None and deadline is None and (started is None or started.done()):
+                deadline = (time.time() if started is None else started.result()) + timeout
+
+            if deadline is None:
+                remaining = None
+                if timeout is not None:
+                    pending.append(started)
+            else:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+            await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+
+    async def _text_to_image(self, prompt: str, model: str, slot_acquired=None, slot_queued=None):
+        """Run the blocking text_to_image call in a worker thread."""
+        if slot_queued is not None and not slot_queued.done():
+            # acquire() blocks exactly when the semaphore reports locked
+            slot_queued.set_result(self._hf_sem.locked())
+        await self._hf_sem.acquire()
+        if slot_acquired is not None and not slot_acquired.done():
+            slot_acquired.set_result(time.time())
+
+        # The Inference API takes one prompt per request, so there is nothing
+        # to batch; concurrent prompts already overlap in worker threads.
+        # The slot is released when the thread finishes rather than when this
+        # coroutine is cancelled, so abandoned fallbacks still count
+        call = asyncio.ensure_future(
+            asyncio.to_thread(self.client.text_to_image, prompt, model=model)
+        )
+        call.add_done_callback(self._release_hf_slot)
+        return await asyncio.shield(call)
+
+    def _release_hf_slot(self, call: asyncio.Future) -> None:
+        """Free a Hugging Face slot once its worker thread has returned."""
+        if not call.cancelled():
+            # Mark the exception as retrieved; the caller may have moved on
+            call.exception()
+        self._hf_sem.release()
+
+    async def _generate_with_model(self, prompt: str, model: str, slot_acquired=None, slot_queued=None):
+        """Generate an image with a single model, returning (model, image)."""
+        try:
+            logger.info("Trying model: %s", model)
+            image = await self._text_to_image(prompt, model, slot_acquired, slot_queued)
+            return model, image
+        except Exception as model_error:
+            logger.warning("Model %s failed: %s", model, model_error)
+            raise
+
+    async def _warmup(self) -> None:
+        """Send a throwaway request to trigger the model's cold start."""
+        try:
+            logger.info("Warming up model: %s", WARMUP_MODEL)
+            # Goes through _text_to_image like any user request: the loading
+            # retries sleep in a worker thread, the call holds one Hugging Face
+            # slot and gives up after HF_TIMEOUT
+            await self._text_to_image("warmup", WARMUP_MODEL)
+            logger.info("Model %s is warm", WARMUP_MODEL)
+        except Exception as e:
+            logger.warning("Warm-up of %s failed: %s", WARMUP_MODEL, e)
 
     async def run_polling(self):
         """Run the bot with polling (background worker mode)."""
@@ -274,8 +593,8 @@ class ImageGeneratorBot:
 
             # Start polling
             await self.application.updater.start_polling(
-                poll_interval=1.0,
-                timeout=30,
+                poll_interval=0.0,
+                timeout=50,
                 bootstrap_retries=-1,
                 read_timeout=30,
                 write_timeout=30,
@@ -287,14 +606,28 @@ class ImageGeneratorBot:
             logger.info("Private chats: Send text descriptions directly")
             logger.info("Groups: Use /medusaXD <description>")
 
-            # Keep the application running
-            while True:
-                await asyncio.sleep(1)
+            # Fire-and-forget warm-up so the first real request hits a loaded model
+            self._warmup_task = asyncio.create_task(self._warmup())
+
+            # Keep the application running until a shutdown signal arrives
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.add_signal_handler(sig, self._stop.set)
+                except NotImplementedError:
+                    # Signal handlers are unavailable on Windows event loops
+                    pass
+            await self._stop.wait()
+            logger.info("Shutdown signal received, stopping bot...")
 
         except Exception as e:
-            logger.error(f"Error in polling: {e}")
+            logger.error("Error in polling: %s", e)
             raise
         finally:
+            if self._warmup_task is not None:
+                self._warmup_task.cancel()
+            if self.application.updater.running:
+                await self.application.updater.stop()
             await self.application.stop()
             await self.application.shutdown()
 
@@ -304,7 +637,7 @@ async def main():
         bot = ImageGeneratorBot()
         await bot.run_polling()
     except Exception as e:
-        logger.error(f"Failed to start bot: {e}")
+        logger.error("Failed to start bot: %s", e)
         raise
 
 if __name__ == '__main__':
@@ -313,5 +646,5 @@ if __name__ == '__main__':
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
-        logger.error(f"Fatal error: {e}")
+        logger.error("Fatal error: %s", e)
         raise